@@ -88,6 +88,7 @@ class Camera(Sensor):
         self.near_plane = near_plane
         self.far_plane = far_plane
         self.frame = None
+        self.frame_counter = 0
         self.projection_matrix = None
         self.resolution = None
         self.hfov = None
@@ -176,6 +177,17 @@ class Camera(Sensor):
         except AssertionError:
             return None
 
+    def getFrameCounter(self):
+        """
+        Returns the frame counter of the camera, incremented each time a new
+        frame is rendered. Comparing two values of the counter allows to know
+        if a new frame is available
+
+        Returns:
+            frame_counter - The number of frames rendered by the camera
+        """
+        return self.frame_counter
+
     def isActive(self):
         """
         Specifies if the camera is active or not (if a handle exists for the
@@ -324,7 +336,7 @@ class Camera(Sensor):
         resolution
         """
         try:
-            assert self.module_process.isAlive()
+            assert self.module_process.is_alive()
 
             while self.getFrame() is None:
                 continue
@@ -439,11 +451,6 @@ class CameraRgb(Camera):
         Frame extraction loop, has to be threaded. The resolution and the FOV
         have to be specified beforehand
         """
-        rgb_image = np.zeros((
-            self.resolution.height,
-            self.resolution.width,
-            3))
-
         while not self._module_termination:
             camera_image = self._getCameraImage()
 
@@ -451,19 +458,12 @@ class CameraRgb(Camera):
                 camera_image[2],
                 (camera_image[1], camera_image[0], 4))
 
-            rgb_image[:, :, 0] =\
-                (1 - camera_image[:, :, 3]) * camera_image[:, :, 2] +\
-                camera_image[:, :, 3] * camera_image[:, :, 2]
-
-            rgb_image[:, :, 1] =\
-                (1 - camera_image[:, :, 3]) * camera_image[:, :, 1] +\
-                camera_image[:, :, 3] * camera_image[:, :, 1]
-
-            rgb_image[:, :, 2] =\
-                (1 - camera_image[:, :, 3]) * camera_image[:, :, 0] +\
-                camera_image[:, :, 3] * camera_image[:, :, 0]
-
-            self.frame = rgb_image.astype(np.uint8)
+            # The alpha channel is dropped and the RGB channels are reversed,
+            # the frame is stored as a contiguous BGR image
+            self.frame = np.ascontiguousarray(
+                camera_image[:, :, 2::-1],
+                dtype=np.uint8)
+            self.frame_counter += 1
 
 
 class CameraDepth(Camera):
@@ -520,4 +520,5 @@ class CameraDepth(Camera):
                     depth_image)
 
             depth_image *= 1000
-            self.frame = depth_image.astype(np.uint16)
\ No newline at end of file
+            self.frame = depth_image.astype(np.uint16)
+            self.frame_counter += 1
\ No newline at end of file
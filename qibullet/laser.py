@@ -65,7 +65,7 @@ class Laser(Sensor):
         Returns:
             boolean - True if the lasers are subscribed, false otherwise
         """
-        return self.module_process.isAlive()
+        return self.module_process.is_alive()
 
     def subscribe(self):
         """
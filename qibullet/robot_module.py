@@ -73,5 +73,5 @@ class RobotModule:
         """
         self._module_termination = True
 
-        if self.module_process.isAlive():
+        if self.module_process.is_alive():
             self.module_process.join()
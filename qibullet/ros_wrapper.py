@@ -3,8 +3,12 @@
 
 import os
 import sys
+import math
+import heapq
 import atexit
 import pybullet
+import numpy as np
+from qibullet.laser import NUM_RAY
 from qibullet.camera import Camera
 from qibullet.camera import CameraRgb
 from qibullet.camera import CameraDepth
@@ -13,20 +17,20 @@ from qibullet.romeo_virtual import RomeoVirtual
 from qibullet.pepper_virtual import PepperVirtual
 from qibullet.base_controller import PepperBaseController
 from threading import Thread
+from threading import Condition
 
 try:
     import rospy
     import roslib
     import roslaunch
-    import tf2_ros
-    from cv_bridge import CvBridge
     from sensor_msgs.msg import Image
+    from sensor_msgs.msg import CompressedImage
     from sensor_msgs.msg import CameraInfo
     from sensor_msgs.msg import JointState
     from sensor_msgs.msg import LaserScan
-    from std_msgs.msg import Header
     from std_msgs.msg import Empty
     from naoqi_bridge_msgs.msg import JointAnglesWithSpeed
+    from tf2_msgs.msg import TFMessage
     from geometry_msgs.msg import TransformStamped
     from geometry_msgs.msg import Twist
     from nav_msgs.msg import Odometry
@@ -50,6 +54,16 @@ class RosWrapper:
     """
     Virtual class defining the basis of a robot ROS wrapper
     """
+    # Publishing frequencies of the odometry and of the lasers, in Hz
+    ODOMETRY_FREQUENCY = 50
+    LASER_FREQUENCY = 20
+
+    # Publishing priorities, the messages with the lowest value are published
+    # first
+    PRIORITY_LASER = 0
+    PRIORITY_JOINT_STATE = 1
+    PRIORITY_ODOMETRY = 2
+    PRIORITY_CAMERA = 3
 
     def __init__(self):
         """
@@ -59,10 +73,24 @@ class RosWrapper:
             raise pybullet.error(MISSING_IMPORT)
 
         self.spin_thread = None
+        self._timers = list()
         self._wrapper_termination = False
-        self.image_bridge = CvBridge()
+        self._publish_condition = Condition()
+        self._publish_queue = list()
+        self._publish_count = 0
+        self._scheduled_messages = dict()
+        self._published_message = None
+        self._camera_messages = dict()
+        self._camera_frame_counters = dict()
         self.roslauncher = None
-        self.transform_broadcaster = tf2_ros.TransformBroadcaster()
+        self.compressed = False
+        self._jpeg_encoder = None
+        self._cv2 = None
+        # The wrapper only broadcasts the odom transform, which is dynamic (the
+        # static transforms of the robot are broadcasted by the robot state
+        # publisher). Only the latest transform is relevant, the queue of the
+        # tf publisher is limited to a single message
+        self.tf_pub = rospy.Publisher("/tf", TFMessage, queue_size=1)
         atexit.register(self.stopWrapper)
 
     def stopWrapper(self):
@@ -71,20 +99,35 @@ class RosWrapper:
         """
         self._wrapper_termination = True
 
+        for timer in self._timers:
+            timer.shutdown()
+            timer.join(timeout=1.0)
+
+        del self._timers[:]
+
+        with self._publish_condition:
+            self._publish_condition.notify()
+
         try:
-            assert self.spin_thread is not None
-            assert isinstance(self.spin_thread, Thread)
-            assert self.spin_thread.isAlive()
-            self.spin_thread.join()
+            if self.spin_thread is not None and self.spin_thread.is_alive():
+                self.spin_thread.join(timeout=1.0)
 
-        except AssertionError:
+        except RuntimeError:
+            # The thread hasn't been started
             pass
 
         if self.roslauncher is not None:
             self.roslauncher.stop()
+            self.roslauncher = None
             print("Stopping roslauncher")
 
-    def launchWrapper(self, virtual_robot, ros_namespace, frequency=200):
+    def launchWrapper(
+            self,
+            virtual_robot,
+            ros_namespace,
+            frequency=100,
+            camera_frequency=30,
+            compressed=False):
         """
         Launches the ROS wrapper
 
@@ -92,21 +135,44 @@ class RosWrapper:
             virtual_robot - The instance of the simulated model
             ros_namespace - The ROS namespace to be added before the ROS topics
             advertized and subscribed
-            frequency - The frequency of the ROS rate that will be used to pace
-            the wrapper's main loop
+            frequency - The frequency at which the joint states are published
+            camera_frequency - The frequency at which the frames of the active
+            cameras are published
+            compressed - If True, the frames of the RGB cameras are published
+            as JPEG CompressedImage messages, on the compressed subtopic of
+            the image topics. The depth frames are always published raw
         """
         if MISSING_IMPORT is not None:
             raise pybullet.error(MISSING_IMPORT)
 
+        self._jpeg_encoder = None
+        self._cv2 = None
+
+        if compressed:
+            self._initJpegEncoder()
+
         self.robot = virtual_robot
+        # The methods called by the subscribers' callbacks are bound once,
+        # before the subscribers are initialized
+        self._set_angles = virtual_robot.setAngles
         self.ros_namespace = ros_namespace
         self.frequency = frequency
+        self.camera_frequency = camera_frequency
+        self.compressed = compressed
+
+        self._camera_messages.clear()
+        self._camera_frame_counters.clear()
 
         rospy.init_node(
             "qibullet_wrapper",
             anonymous=True,
             disable_signals=False)
 
+        # The publishing threads wait for messages to be scheduled, they are
+        # stopped when rospy is shut down (the ROS timers scheduling the
+        # messages being stopped as well)
+        rospy.on_shutdown(self.stopWrapper)
+
         # Upload the robot description to the ros parameter server
         try:
             if isinstance(self.robot, PepperVirtual):
@@ -143,12 +209,26 @@ class RosWrapper:
         # Initialize the ROS publisher and subscribers
         self._initPublishers()
         self._initSubscribers()
+        self._initMessages()
 
-        # Launch the wrapper's main loop
+        # Launch the wrapper's main loop, publishing the scheduled messages by
+        # order of priority, and a ROS timer for each type of data, computing
+        # and scheduling the messages at its own frequency. The publishers
+        # being queued, rospy writes the messages of the different topics
+        # concurrently, a single thread is enough to publish them
         self._wrapper_termination = False
+        del self._publish_queue[:]
+        self._scheduled_messages.clear()
+        self._published_message = None
+
         self.spin_thread = Thread(target=self._spin)
+        # A daemon thread won't prevent the process from exiting if the
+        # wrapper isn't properly stopped
+        self.spin_thread.daemon = True
         self.spin_thread.start()
 
+        self._initTimers()
+
     def _initPublishers(self):
         """
         ABSTRACT INTERNAL METHOD, needs to be implemented in each daughter
@@ -163,54 +243,347 @@ class RosWrapper:
         """
         raise NotImplementedError
 
+    def _initJpegEncoder(self):
+        """
+        INTERNAL METHOD, initializes the JPEG encoder used to publish
+        compressed camera images. The images are encoded on the GPU by
+        nvImageCodec if available, on the CPU by OpenCV otherwise. The
+        encoders are only imported if compressed images are published
+        """
+        try:
+            from nvidia import nvimgcodec
+            self._jpeg_encoder = nvimgcodec.Encoder()
+            return
+
+        except ImportError:
+            pass
+
+        try:
+            import cv2
+            self._cv2 = cv2
+
+        except ImportError:
+            raise pybullet.error(
+                "Cannot publish compressed images, nvImageCodec or OpenCV is "
+                "required to encode them")
+
+    def _createImagePublisher(self, topic, depth=False):
+        """
+        INTERNAL METHOD, creates the publisher of a camera's images. If the
+        wrapper publishes compressed images, the publisher of an RGB camera
+        will publish CompressedImage messages on the compressed subtopic of
+        the specified topic
+
+        Parameters:
+            topic - The topic of the raw images
+            depth - Boolean, True if the images are depth images (which are
+            always published raw), False otherwise
+
+        Returns:
+            publisher - The ROS publisher for the camera's images
+        """
+        if self.compressed and not depth:
+            return rospy.Publisher(
+                topic + '/compressed',
+                CompressedImage,
+                queue_size=10)
+
+        return rospy.Publisher(topic, Image, queue_size=10)
+
     def _spin(self):
         """
-        ABSTRACT INTERNAL METHOD, needs to be implemented in each daughter
-        class. Designed to emulate a ROS spin method
+        INTERNAL METHOD, designed to emulate a ROS spin method. Publishes the
+        scheduled messages by order of priority
         """
-        raise NotImplementedError
+        try:
+            while True:
+                with self._publish_condition:
+                    while not self._wrapper_termination and\
+                            len(self._publish_queue) == 0:
+                        self._publish_condition.wait()
+
+                    if self._wrapper_termination:
+                        break
+
+                    _, _, publisher = heapq.heappop(self._publish_queue)
+                    message = self._scheduled_messages.pop(publisher)
+                    self._published_message = message
+
+                try:
+                    publisher.publish(message)
+
+                finally:
+                    with self._publish_condition:
+                        self._published_message = None
+
+        except Exception as e:
+            print("Stopping the ROS wrapper: " + str(e))
+
+    def _isPublishing(self, *messages):
+        """
+        INTERNAL METHOD, to be called while holding the publish condition.
+        Specifies if one of the messages is being published by the wrapper's
+        main loop. A message being published shouldn't be modified
+
+        Parameters:
+            messages - The messages to be checked
+
+        Returns:
+            is_publishing - Boolean, True if one of the messages is being
+            published, False otherwise
+        """
+        return any(message is self._published_message for message in messages)
 
-    def _broadcastOdometry(self, odometry_publisher):
+    def _schedulePublish(self, priority, publisher, message):
+        """
+        INTERNAL METHOD, to be called while holding the publish condition.
+        Schedules the publication of a message by the wrapper's main loop. If
+        a message is already scheduled for the same publisher, it is replaced
+        by the new message, keeping its place in the queue
+
+        Parameters:
+            priority - The priority of the message, the messages with the
+            lowest priority value are published first
+            publisher - The ROS publisher for the message
+            message - The message to be published
+        """
+        if publisher not in self._scheduled_messages:
+            heapq.heappush(
+                self._publish_queue,
+                (priority, self._publish_count, publisher))
+
+            self._publish_count += 1
+
+        self._scheduled_messages[publisher] = message
+        self._publish_condition.notify()
+
+    def _initTimers(self):
+        """
+        INTERNAL METHOD, launches the ROS timers publishing the joint states,
+        the odometry and the camera frames
+        """
+        self._addTimer(
+            self.frequency,
+            self._broadcastJointState,
+            self.joint_states_pub)
+
+        self._addTimer(
+            RosWrapper.ODOMETRY_FREQUENCY,
+            self._broadcastOdometry,
+            self.odom_pub)
+
+        self._addTimer(self.camera_frequency, self._broadcastCamera)
+
+    def _addTimer(self, frequency, broadcast_method, *args):
+        """
+        INTERNAL METHOD, launches a ROS timer calling a broadcasting method at
+        the specified frequency. The broadcasting method is called with the
+        specified arguments, followed by the ROS time of the timer event. The
+        timer is shut down if the broadcasting method raises an exception
+
+        Parameters:
+            frequency - The frequency of the timer, in Hz
+            broadcast_method - The broadcasting method called by the timer
+            args - The arguments passed to the broadcasting method
+        """
+        def callback(event):
+            if self._wrapper_termination:
+                return
+
+            try:
+                broadcast_method(*(args + (event.current_real,)))
+
+            except Exception as e:
+                print("Stopping a ROS wrapper timer: " + str(e))
+                timer.shutdown()
+
+        timer = rospy.Timer(rospy.Duration(1.0 / frequency), callback)
+        self._timers.append(timer)
+
+    def _initMessages(self, extra_joints=None):
+        """
+        INTERNAL METHOD, computes the invariant content of the ROS messages
+        once, before launching the wrapper's loops
+
+        Parameters:
+            extra_joints - A dict, describing extra joints to be published
+            along with the robot's joints. The dict should respect the
+            following syntax: {"joint_name": joint_value, ...}
+        """
+        self._joint_names = list(self.robot.joint_dict)
+        self._joint_state_names = list(self._joint_names)
+        self._extra_joint_values = list()
+
+        try:
+            assert isinstance(extra_joints, dict)
+
+            for name, value in extra_joints.items():
+                self._joint_state_names.append(name)
+                self._extra_joint_values.append(value)
+
+        except AssertionError:
+            pass
+
+        self._joint_state_msg = JointState()
+        self._joint_state_msg.name = self._joint_state_names
+
+        self._odom_trans_msg = TransformStamped()
+        self._odom_trans_msg.header.frame_id = "odom"
+        self._odom_trans_msg.child_frame_id = "base_link"
+        self._odom_trans_msg.transform.translation.z = 0.0
+        self._odom_trans_msg.transform.rotation.x = 0.0
+        self._odom_trans_msg.transform.rotation.y = 0.0
+
+        self._tf_msg = TFMessage(transforms=[self._odom_trans_msg])
+
+        self._odom_msg = Odometry()
+        self._odom_msg.header.frame_id = "odom"
+        self._odom_msg.child_frame_id = "base_link"
+        self._odom_msg.pose.pose.position.z = 0.0
+        self._odom_msg.pose.pose.orientation =\
+            self._odom_trans_msg.transform.rotation
+
+    def _getCameraMessages(self, camera):
+        """
+        INTERNAL METHOD, returns the Image and CameraInfo message templates of
+        a camera. The templates are cached, and only built again if the camera
+        has been subscribed to with another resolution. Only the stamps of the
+        headers and the image data have to be filled before publishing them
+
+        Parameters:
+            camera - The camera used for broadcasting
+
+        Returns:
+            image_msg - The Image message template of the camera
+            info_msg - The CameraInfo message template of the camera
+            dtype - The NumPy type of the image data, matching the encoding of
+            the Image message template
+        """
+        camera_id = camera.getCameraId()
+        resolution = camera.getResolution()
+        messages = self._camera_messages.get(camera_id)
+
+        if messages is not None and messages[0] is resolution:
+            return messages[1:]
+
+        frame_id = camera.getCameraLink().getName()
+
+        # Fill the camera info message
+        info_msg = CameraInfo()
+        info_msg.distortion_model = "plumb_bob"
+        info_msg.header.frame_id = frame_id
+        info_msg.width = resolution.width
+        info_msg.height = resolution.height
+        info_msg.D = [0.0, 0.0, 0.0, 0.0, 0.0]
+        info_msg.K = camera._getCameraIntrinsics()
+        info_msg.R = [1, 0, 0, 0, 1, 0, 0, 0, 1]
+        info_msg.P = list(info_msg.K)
+        info_msg.P.insert(3, 0.0)
+        info_msg.P.insert(7, 0.0)
+        info_msg.P.append(0.0)
+
+        # Fill the image message, depending on the image being a compressed
+        # RGB image, a raw RGB image (3 uint8 channels) or a depth image (1
+        # uint16 channel)
+        if self.compressed and not isinstance(camera, CameraDepth):
+            image_msg = CompressedImage()
+            image_msg.header.frame_id = frame_id
+            image_msg.format = "bgr8; jpeg compressed bgr8"
+
+            self._camera_messages[camera_id] =\
+                (resolution, image_msg, info_msg, np.uint8)
+
+            return image_msg, info_msg, np.uint8
+
+        image_msg = Image()
+        image_msg.header.frame_id = frame_id
+        image_msg.width = resolution.width
+        image_msg.height = resolution.height
+        image_msg.is_bigendian = sys.byteorder == "big"
+
+        if isinstance(camera, CameraDepth):
+            image_msg.encoding = "16UC1"
+            image_msg.step = resolution.width * 2
+            dtype = np.uint16
+        else:
+            image_msg.encoding = "bgr8"
+            image_msg.step = resolution.width * 3
+            dtype = np.uint8
+
+        self._camera_messages[camera_id] =\
+            (resolution, image_msg, info_msg, dtype)
+
+        return image_msg, info_msg, dtype
+
+    def _broadcastOdometry(self, odometry_publisher, stamp):
         """
         INTERNAL METHOD, computes an odometry message based on the robot's
         position, and broadcast it
 
         Parameters:
             odometry_publisher - The ROS publisher for the odometry message
+            stamp - The ROS time used to stamp the messages
         """
-        # Send Transform odom
+        # Nothing is computed if no node listens to the transform or to the
+        # odometry, the velocity is only retrieved for the odometry message
+        publish_tf = self.tf_pub.get_num_connections() > 0
+        publish_odom = odometry_publisher.get_num_connections() > 0
+
+        if not publish_tf and not publish_odom:
+            return
+
         x, y, theta = self.robot.getPosition()
-        odom_trans = TransformStamped()
-        odom_trans.header.frame_id = "odom"
-        odom_trans.child_frame_id = "base_link"
-        odom_trans.header.stamp = rospy.get_rostime()
-        odom_trans.transform.translation.x = x
-        odom_trans.transform.translation.y = y
-        odom_trans.transform.translation.z = 0
-        quaternion = pybullet.getQuaternionFromEuler([0, 0, theta])
-        odom_trans.transform.rotation.x = quaternion[0]
-        odom_trans.transform.rotation.y = quaternion[1]
-        odom_trans.transform.rotation.z = quaternion[2]
-        odom_trans.transform.rotation.w = quaternion[3]
-        self.transform_broadcaster.sendTransform(odom_trans)
-        # Set up the odometry
-        odom = Odometry()
-        odom.header.stamp = rospy.get_rostime()
-        odom.header.frame_id = "odom"
-        odom.pose.pose.position.x = x
-        odom.pose.pose.position.y = y
-        odom.pose.pose.position.z = 0.0
-        odom.pose.pose.orientation = odom_trans.transform.rotation
-        odom.child_frame_id = "base_link"
-        [vx, vy, vz], [wx, wy, wz] = pybullet.getBaseVelocity(
-            self.robot.getRobotModel(),
-            self.robot.getPhysicsClientId())
-        odom.twist.twist.linear.x = vx
-        odom.twist.twist.linear.y = vy
-        odom.twist.twist.angular.z = wz
-        odometry_publisher.publish(odom)
-
-    def _broadcastCamera(self, camera, image_publisher, info_publisher):
+
+        if publish_odom:
+            [vx, vy, vz], [wx, wy, wz] = pybullet.getBaseVelocity(
+                self.robot.getRobotModel(),
+                self.robot.getPhysicsClientId())
+
+        with self._publish_condition:
+            # The orientation of the odometry message references the rotation
+            # of the transform, both messages are left untouched if one of
+            # them is being published
+            if self._isPublishing(self._tf_msg, self._odom_msg):
+                return
+
+            # Send Transform odom
+            odom_trans = self._odom_trans_msg
+            odom_trans.header.stamp = stamp
+            odom_trans.transform.translation.x = x
+            odom_trans.transform.translation.y = y
+            # Quaternion of a rotation of theta around the z axis, the x and y
+            # components are always null and set once in @_initMessages
+            odom_trans.transform.rotation.z = math.sin(theta * 0.5)
+            odom_trans.transform.rotation.w = math.cos(theta * 0.5)
+
+            if publish_tf:
+                self._schedulePublish(
+                    RosWrapper.PRIORITY_ODOMETRY,
+                    self.tf_pub,
+                    self._tf_msg)
+
+            if not publish_odom:
+                return
+
+            # Set up the odometry
+            odom = self._odom_msg
+            odom.header.stamp = stamp
+            odom.pose.pose.position.x = x
+            odom.pose.pose.position.y = y
+            odom.twist.twist.linear.x = vx
+            odom.twist.twist.linear.y = vy
+            odom.twist.twist.angular.z = wz
+            self._schedulePublish(
+                RosWrapper.PRIORITY_ODOMETRY,
+                odometry_publisher,
+                odom)
+
+    def _broadcastCamera(
+            self,
+            camera,
+            image_publisher,
+            info_publisher,
+            stamp):
         """
         INTERNAL METHOD, computes the image message and the info message of the
         given camera and publishes them into the ROS framework
@@ -221,43 +594,86 @@ class RosWrapper:
             corresponding to the image delivered by the active camera
             info_publisher - The ROS publisher for the CameraInfo message,
             corresponding to the parameters of the active camera
+            stamp - The ROS time used to stamp the messages
         """
         try:
-            frame = camera.getFrame()
+            # The frame isn't converted if no node listens to the camera
+            assert image_publisher.get_num_connections() > 0 or\
+                info_publisher.get_num_connections() > 0
+
+            # Skip the frames that have already been published. The counter is
+            # retrieved before the frame, at worst a new frame will be
+            # published twice
+            frame_counter = camera.getFrameCounter()
+            assert frame_counter != self._camera_frame_counters.get(
+                camera.getCameraId())
+
+            frame = camera.frame
             assert frame is not None
 
-            # Fill the camera info message
-            info_msg = CameraInfo()
-            info_msg.distortion_model = "plumb_bob"
-            info_msg.header.frame_id = camera.getCameraLink().getName()
-            info_msg.width = camera.getResolution().width
-            info_msg.height = camera.getResolution().height
-            info_msg.D = [0.0, 0.0, 0.0, 0.0, 0.0]
-            info_msg.K = camera._getCameraIntrinsics()
-            info_msg.R = [1, 0, 0, 0, 1, 0, 0, 0, 1]
-            info_msg.P = list(info_msg.K)
-            info_msg.P.insert(3, 0.0)
-            info_msg.P.insert(7, 0.0)
-            info_msg.P.append(0.0)
-
-            # Fill the image message
-            image_msg = self.image_bridge.cv2_to_imgmsg(frame)
-            image_msg.header.frame_id = camera.getCameraLink().getName()
-
-            # Check if the retrieved image is RGB or a depth image
-            if isinstance(camera, CameraDepth):
-                image_msg.encoding = "16UC1"
+            # The camera can still hold a frame of its previous resolution
+            # after being subscribed to with another resolution, the messages
+            # being built from the current resolution such a frame is skipped
+            resolution = camera.getResolution()
+            assert frame.shape[:2] == (resolution.height, resolution.width)
+
+            image_msg, info_msg, dtype = self._getCameraMessages(camera)
+
+            # The frame array is never modified once produced by the camera,
+            # its data can be used without being copied beforehand. The frames
+            # are already contiguous arrays of the expected type, in which case
+            # np.ascontiguousarray doesn't copy them
+            if isinstance(image_msg, CompressedImage):
+                data = self._encodeJpeg(frame)
             else:
-                image_msg.encoding = "bgr8"
+                data = np.ascontiguousarray(frame, dtype=dtype).tobytes()
+
+            # Schedule the image and the camera info. If the previous messages
+            # of the camera are still being published, the frame will be
+            # published at the next call
+            with self._publish_condition:
+                assert not self._isPublishing(image_msg, info_msg)
+
+                image_msg.data = data
+                image_msg.header.stamp = stamp
+                info_msg.header.stamp = stamp
 
-            # Publish the image and the camera info
-            image_publisher.publish(image_msg)
-            info_publisher.publish(info_msg)
+                self._schedulePublish(
+                    RosWrapper.PRIORITY_CAMERA,
+                    image_publisher,
+                    image_msg)
+
+                self._schedulePublish(
+                    RosWrapper.PRIORITY_CAMERA,
+                    info_publisher,
+                    info_msg)
+
+            self._camera_frame_counters[camera.getCameraId()] =\
+                frame_counter
 
         except AssertionError:
             pass
 
-    def _broadcastJointState(self, joint_state_publisher, extra_joints=None):
+    def _encodeJpeg(self, frame):
+        """
+        INTERNAL METHOD, encodes a BGR frame into a JPEG image, on the GPU if
+        nvImageCodec is available, on the CPU with OpenCV otherwise
+
+        Parameters:
+            frame - The BGR frame to be encoded
+
+        Returns:
+            jpeg_data - The bytes of the JPEG image
+        """
+        if self._jpeg_encoder is not None:
+            # nvImageCodec expects interleaved RGB images
+            return bytes(self._jpeg_encoder.encode(
+                np.ascontiguousarray(frame[:, :, ::-1]),
+                "jpeg"))
+
+        return self._cv2.imencode(".jpg", frame)[1].tobytes()
+
+    def _broadcastJointState(self, joint_state_publisher, stamp):
         """
         INTERNAL METHOD, publishes the state of the robot's joints into the ROS
         framework
@@ -265,28 +681,23 @@ class RosWrapper:
         Parameters:
             joint_state_publisher - The ROS publisher for the JointState
             message, describing the state of the robot's joints
-            extra_joints - A dict, describing extra joints to be published. The
-            dict should respect the following syntax:
-            {"joint_name": joint_value, ...}
+            stamp - The ROS time used to stamp the message
         """
-        msg_joint_state = JointState()
-        msg_joint_state.header = Header()
-        msg_joint_state.header.stamp = rospy.get_rostime()
-        msg_joint_state.name = list(self.robot.joint_dict)
-        msg_joint_state.position = self.robot.getAnglesPosition(
-            msg_joint_state.name)
+        position = self.robot.getAnglesPosition(self._joint_names) +\
+            self._extra_joint_values
 
-        try:
-            assert isinstance(extra_joints, dict)
-
-            for name, value in extra_joints.items():
-                msg_joint_state.name += [name]
-                msg_joint_state.position += [value]
+        with self._publish_condition:
+            msg_joint_state = self._joint_state_msg
 
-        except AssertionError:
-            pass
+            if self._isPublishing(msg_joint_state):
+                return
 
-        joint_state_publisher.publish(msg_joint_state)
+            msg_joint_state.header.stamp = stamp
+            msg_joint_state.position = position
+            self._schedulePublish(
+                RosWrapper.PRIORITY_JOINT_STATE,
+                joint_state_publisher,
+                msg_joint_state)
 
     def _jointAnglesCallback(self, msg):
         """
@@ -299,6 +710,9 @@ class RosWrapper:
             naoqi_bridge_msgs::JointAnglesWithSpeed. That type can be found in
             the ros naoqi software stack
         """
+        # The float arrays of the message are deserialized as tuples, whereas
+        # the setAngles methods expect lists. The joint names are already
+        # deserialized as a list
         joint_list = msg.joint_names
         position_list = list(msg.joint_angles)
 
@@ -306,18 +720,12 @@ class RosWrapper:
         # used, will try to detect if multiple speeds have been provided. If
         # not, or if the "official" driver is used, the speed attribute of the
         # message will be used
-        try:
-            assert not OFFICIAL_DRIVER
-
-            if len(msg.speeds) != 0:
-                velocity = list(msg.speeds)
-            else:
-                velocity = msg.speed
-
-        except AssertionError:
+        if not OFFICIAL_DRIVER and msg.speeds:
+            velocity = list(msg.speeds)
+        else:
             velocity = msg.speed
 
-        self.robot.setAngles(joint_list, position_list, velocity)
+        self._set_angles(joint_list, position_list, velocity)
 
 
 class NaoRosWrapper(RosWrapper):
@@ -331,7 +739,13 @@ class NaoRosWrapper(RosWrapper):
         """
         RosWrapper.__init__(self)
 
-    def launchWrapper(self, virtual_nao, ros_namespace, frequency=200):
+    def launchWrapper(
+            self,
+            virtual_nao,
+            ros_namespace,
+            frequency=100,
+            camera_frequency=30,
+            compressed=False):
         """
         Launches the ROS wrapper for the virtual_nao instance
 
@@ -339,33 +753,35 @@ class NaoRosWrapper(RosWrapper):
             virtual_nao - The instance of the simulated model
             ros_namespace - The ROS namespace to be added before the ROS topics
             advertized and subscribed
-            frequency - The frequency of the ROS rate that will be used to pace
-            the wrapper's main loop
+            frequency - The frequency at which the joint states are published
+            camera_frequency - The frequency at which the frames of the active
+            cameras are published
+            compressed - If True, the frames of the RGB cameras are published
+            as JPEG CompressedImage messages, on the compressed subtopic of
+            the image topics. The depth frames are always published raw
         """
         RosWrapper.launchWrapper(
             self,
             virtual_nao,
             ros_namespace,
-            frequency)
+            frequency,
+            camera_frequency,
+            compressed)
 
     def _initPublishers(self):
         """
         INTERNAL METHOD, initializes the ROS publishers
         """
-        self.front_cam_pub = rospy.Publisher(
-            self.ros_namespace + '/camera/front/image_raw',
-            Image,
-            queue_size=10)
+        self.front_cam_pub = self._createImagePublisher(
+            self.ros_namespace + '/camera/front/image_raw')
 
         self.front_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/front/camera_info',
             CameraInfo,
             queue_size=10)
 
-        self.bottom_cam_pub = rospy.Publisher(
-            self.ros_namespace + '/camera/bottom/image_raw',
-            Image,
-            queue_size=10)
+        self.bottom_cam_pub = self._createImagePublisher(
+            self.ros_namespace + '/camera/bottom/image_raw')
 
         self.bottom_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/bottom/camera_info',
@@ -389,53 +805,33 @@ class NaoRosWrapper(RosWrapper):
         rospy.Subscriber(
             '/joint_angles',
             JointAnglesWithSpeed,
-            self._jointAnglesCallback)
+            self._jointAnglesCallback,
+            queue_size=10,
+            buff_size=2**20,
+            tcp_nodelay=True)
 
-    def _broadcastCamera(self):
+    def _broadcastCamera(self, stamp):
         """
         INTERNAL METHOD, overloading @_broadcastCamera in RosWrapper
+
+        Parameters:
+            stamp - The ROS time used to stamp the messages
         """
         if self.robot.camera_dict[NaoVirtual.ID_CAMERA_TOP].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[NaoVirtual.ID_CAMERA_TOP],
                 self.front_cam_pub,
-                self.front_info_pub)
+                self.front_info_pub,
+                stamp)
 
         if self.robot.camera_dict[NaoVirtual.ID_CAMERA_BOTTOM].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[NaoVirtual.ID_CAMERA_BOTTOM],
                 self.bottom_cam_pub,
-                self.bottom_info_pub)
-
-    def _broadcastJointState(self, joint_state_publisher):
-        """
-        INTERNAL METHOD, publishes the state of the robot's joints into the ROS
-        framework, overloading @_broadcastJointState in RosWrapper
-
-        Parameters:
-            joint_state_publisher - The ROS publisher for the JointState
-            message, describing the state of the robot's joints (for API
-            consistency)
-        """
-        RosWrapper._broadcastJointState(self, joint_state_publisher)
-
-    def _spin(self):
-        """
-        INTERNAL METHOD, designed to emulate a ROS spin method
-        """
-        rate = rospy.Rate(self.frequency)
-
-        try:
-            while not self._wrapper_termination:
-                rate.sleep()
-                self._broadcastJointState(self.joint_states_pub)
-                self._broadcastOdometry(self.odom_pub)
-                self._broadcastCamera()
-
-        except Exception as e:
-            print("Stopping the ROS wrapper: " + str(e))
+                self.bottom_info_pub,
+                stamp)
 
 
 class RomeoRosWrapper(RosWrapper):
@@ -449,7 +845,13 @@ class RomeoRosWrapper(RosWrapper):
         """
         RosWrapper.__init__(self)
 
-    def launchWrapper(self, virtual_romeo, ros_namespace, frequency=200):
+    def launchWrapper(
+            self,
+            virtual_romeo,
+            ros_namespace,
+            frequency=100,
+            camera_frequency=30,
+            compressed=False):
         """
         Launches the ROS wrapper for the virtual_romeo instance
 
@@ -457,43 +859,44 @@ class RomeoRosWrapper(RosWrapper):
             virtual_romeo - The instance of the simulated model
             ros_namespace - The ROS namespace to be added before the ROS topics
             advertized and subscribed
-            frequency - The frequency of the ROS rate that will be used to pace
-            the wrapper's main loop
+            frequency - The frequency at which the joint states are published
+            camera_frequency - The frequency at which the frames of the active
+            cameras are published
+            compressed - If True, the frames of the RGB cameras are published
+            as JPEG CompressedImage messages, on the compressed subtopic of
+            the image topics. The depth frames are always published raw
         """
         RosWrapper.launchWrapper(
             self,
             virtual_romeo,
             ros_namespace,
-            frequency)
+            frequency,
+            camera_frequency,
+            compressed)
 
     def _initPublishers(self):
         """
         INTERNAL METHOD, initializes the ROS publishers
         """
-        self.right_cam_pub = rospy.Publisher(
-            self.ros_namespace + '/camera/right/image_raw',
-            Image,
-            queue_size=10)
+        self.right_cam_pub = self._createImagePublisher(
+            self.ros_namespace + '/camera/right/image_raw')
 
         self.right_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/right/camera_info',
             CameraInfo,
             queue_size=10)
 
-        self.left_cam_pub = rospy.Publisher(
-            self.ros_namespace + '/camera/left/image_raw',
-            Image,
-            queue_size=10)
+        self.left_cam_pub = self._createImagePublisher(
+            self.ros_namespace + '/camera/left/image_raw')
 
         self.left_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/left/camera_info',
             CameraInfo,
             queue_size=10)
 
-        self.depth_cam_pub = rospy.Publisher(
+        self.depth_cam_pub = self._createImagePublisher(
             self.ros_namespace + '/camera/depth/image_raw',
-            Image,
-            queue_size=10)
+            depth=True)
 
         self.depth_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/depth/camera_info',
@@ -517,60 +920,41 @@ class RomeoRosWrapper(RosWrapper):
         rospy.Subscriber(
             '/joint_angles',
             JointAnglesWithSpeed,
-            self._jointAnglesCallback)
+            self._jointAnglesCallback,
+            queue_size=10,
+            buff_size=2**20,
+            tcp_nodelay=True)
 
-    def _broadcastCamera(self):
+    def _broadcastCamera(self, stamp):
         """
         INTERNAL METHOD, overloading @_broadcastCamera in RosWrapper
+
+        Parameters:
+            stamp - The ROS time used to stamp the messages
         """
         if self.robot.camera_dict[RomeoVirtual.ID_CAMERA_RIGHT].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[RomeoVirtual.ID_CAMERA_RIGHT],
                 self.right_cam_pub,
-                self.right_info_pub)
+                self.right_info_pub,
+                stamp)
 
         if self.robot.camera_dict[RomeoVirtual.ID_CAMERA_LEFT].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[RomeoVirtual.ID_CAMERA_LEFT],
                 self.left_cam_pub,
-                self.left_info_pub)
+                self.left_info_pub,
+                stamp)
 
         if self.robot.camera_dict[RomeoVirtual.ID_CAMERA_DEPTH].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[RomeoVirtual.ID_CAMERA_DEPTH],
                 self.depth_cam_pub,
-                self.depth_info_pub)
-
-    def _broadcastJointState(self, joint_state_publisher):
-        """
-        INTERNAL METHOD, publishes the state of the robot's joints into the ROS
-        framework, overloading @_broadcastJointState in RosWrapper
-
-        Parameters:
-            joint_state_publisher - The ROS publisher for the JointState
-            message, describing the state of the robot's joints (for API
-            consistency)
-        """
-        RosWrapper._broadcastJointState(self, joint_state_publisher)
-
-    def _spin(self):
-        """
-        INTERNAL METHOD, designed to emulate a ROS spin method
-        """
-        rate = rospy.Rate(self.frequency)
-
-        try:
-            while not self._wrapper_termination:
-                rate.sleep()
-                self._broadcastJointState(self.joint_states_pub)
-                self._broadcastOdometry(self.odom_pub)
-                self._broadcastCamera()
-
-        except Exception as e:
-            print("Stopping the ROS wrapper: " + str(e))
+                self.depth_info_pub,
+                stamp)
 
 
 class PepperRosWrapper(RosWrapper):
@@ -585,7 +969,13 @@ class PepperRosWrapper(RosWrapper):
         """
         RosWrapper.__init__(self)
 
-    def launchWrapper(self, virtual_pepper, ros_namespace, frequency=200):
+    def launchWrapper(
+            self,
+            virtual_pepper,
+            ros_namespace,
+            frequency=100,
+            camera_frequency=30,
+            compressed=False):
         """
         Launches the ROS wrapper for the virtual_pepper instance
 
@@ -593,43 +983,47 @@ class PepperRosWrapper(RosWrapper):
             virtual_pepper - The instance of the simulated model
             ros_namespace - The ROS namespace to be added before the ROS topics
             advertized and subscribed
-            frequency - The frequency of the ROS rate that will be used to pace
-            the wrapper's main loop
+            frequency - The frequency at which the joint states are published
+            camera_frequency - The frequency at which the frames of the active
+            cameras are published
+            compressed - If True, the frames of the RGB cameras are published
+            as JPEG CompressedImage messages, on the compressed subtopic of
+            the image topics. The depth frames are always published raw
         """
+        self._move = virtual_pepper.move
+        self._move_to = virtual_pepper.moveTo
+
         RosWrapper.launchWrapper(
             self,
             virtual_pepper,
             ros_namespace,
-            frequency)
+            frequency,
+            camera_frequency,
+            compressed)
 
     def _initPublishers(self):
         """
         INTERNAL METHOD, initializes the ROS publishers
         """
-        self.front_cam_pub = rospy.Publisher(
-            self.ros_namespace + '/camera/front/image_raw',
-            Image,
-            queue_size=10)
+        self.front_cam_pub = self._createImagePublisher(
+            self.ros_namespace + '/camera/front/image_raw')
 
         self.front_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/front/camera_info',
             CameraInfo,
             queue_size=10)
 
-        self.bottom_cam_pub = rospy.Publisher(
-            self.ros_namespace + '/camera/bottom/image_raw',
-            Image,
-            queue_size=10)
+        self.bottom_cam_pub = self._createImagePublisher(
+            self.ros_namespace + '/camera/bottom/image_raw')
 
         self.bottom_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/bottom/camera_info',
             CameraInfo,
             queue_size=10)
 
-        self.depth_cam_pub = rospy.Publisher(
+        self.depth_cam_pub = self._createImagePublisher(
             self.ros_namespace + '/camera/depth/image_raw',
-            Image,
-            queue_size=10)
+            depth=True)
 
         self.depth_info_pub = rospy.Publisher(
             self.ros_namespace + '/camera/depth/camera_info',
@@ -658,24 +1052,33 @@ class PepperRosWrapper(RosWrapper):
         rospy.Subscriber(
             '/joint_angles',
             JointAnglesWithSpeed,
-            self._jointAnglesCallback)
+            self._jointAnglesCallback,
+            queue_size=10,
+            buff_size=2**20,
+            tcp_nodelay=True)
 
         rospy.Subscriber(
             '/cmd_vel',
             Twist,
-            self._velocityCallback)
+            self._velocityCallback,
+            queue_size=1,
+            buff_size=2**20)
 
         rospy.Subscriber(
             '/move_base_simple/goal',
             MovetoPose,
-            self._moveToCallback)
+            self._moveToCallback,
+            queue_size=1,
+            buff_size=2**20)
 
         rospy.Subscriber(
             '/move_base_simple/cancel',
             Empty,
-            self._killMoveCallback)
+            self._killMoveCallback,
+            queue_size=1,
+            buff_size=2**20)
 
-    def _broadcastLasers(self, laser_publisher):
+    def _broadcastLasers(self, laser_publisher, stamp):
         """
         INTERNAL METHOD, publishes the laser values in the ROS framework
 
@@ -683,80 +1086,104 @@ class PepperRosWrapper(RosWrapper):
             laser_publisher - The ROS publisher for the LaserScan message,
             corresponding to the laser info of the pepper robot (for API
             consistency)
+            stamp - The ROS time used to stamp the message
         """
-        if not self.robot.laser_manager.isActive():
+        if not self.robot.laser_manager.isActive() or\
+                laser_publisher.get_num_connections() == 0:
             return
 
-        scan = LaserScan()
-        scan.header.stamp = rospy.get_rostime()
-        scan.header.frame_id = "base_footprint"
-        # -120 degres, 120 degres
-        scan.angle_min = -2.0944
-        scan.angle_max = 2.0944
-
-        # 240 degres FoV, 61 points (blind zones inc)
-        scan.angle_increment = (2 * 2.0944) / (15.0 + 15.0 + 15.0 + 8.0 + 8.0)
-
-        # Detection ranges for the lasers in meters, 0.1 to 3.0 meters
-        scan.range_min = 0.1
-        scan.range_max = 3.0
+        # Fill the lasers information, the blind zones between the lasers
+        # keep the -1 values of the preallocated ranges
+        self._scan_ranges[0:NUM_RAY] =\
+            self.robot.getRightLaserValue()[::-1]
+        self._scan_ranges[NUM_RAY + 8:2*NUM_RAY + 8] =\
+            self.robot.getFrontLaserValue()[::-1]
+        self._scan_ranges[2*NUM_RAY + 16:3*NUM_RAY + 16] =\
+            self.robot.getLeftLaserValue()[::-1]
 
-        # Fill the lasers information
-        right_scan = self.robot.getRightLaserValue()
-        front_scan = self.robot.getFrontLaserValue()
-        left_scan = self.robot.getLeftLaserValue()
+        with self._publish_condition:
+            scan = self._scan_msg
 
-        if isinstance(right_scan, list):
-            scan.ranges.extend(list(reversed(right_scan)))
-            scan.ranges.extend([-1]*8)
-        if isinstance(front_scan, list):
-            scan.ranges.extend(list(reversed(front_scan)))
-            scan.ranges.extend([-1]*8)
-        if isinstance(left_scan, list):
-            scan.ranges.extend(list(reversed(left_scan)))
+            if self._isPublishing(scan):
+                return
 
-        laser_publisher.publish(scan)
+            scan.header.stamp = stamp
+            scan.ranges = self._scan_ranges.tolist()
+            self._schedulePublish(
+                RosWrapper.PRIORITY_LASER,
+                laser_publisher,
+                scan)
 
-    def _broadcastCamera(self):
+    def _broadcastCamera(self, stamp):
         """
         INTERNAL METHOD, overloading @_broadcastCamera in RosWrapper
+
+        Parameters:
+            stamp - The ROS time used to stamp the messages
         """
         if self.robot.camera_dict[PepperVirtual.ID_CAMERA_TOP].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[PepperVirtual.ID_CAMERA_TOP],
                 self.front_cam_pub,
-                self.front_info_pub)
+                self.front_info_pub,
+                stamp)
 
         if self.robot.camera_dict[PepperVirtual.ID_CAMERA_BOTTOM].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[PepperVirtual.ID_CAMERA_BOTTOM],
                 self.bottom_cam_pub,
-                self.bottom_info_pub)
+                self.bottom_info_pub,
+                stamp)
 
         if self.robot.camera_dict[PepperVirtual.ID_CAMERA_DEPTH].isActive():
             RosWrapper._broadcastCamera(
                 self,
                 self.robot.camera_dict[PepperVirtual.ID_CAMERA_DEPTH],
                 self.depth_cam_pub,
-                self.depth_info_pub)
+                self.depth_info_pub,
+                stamp)
 
-    def _broadcastJointState(self, joint_state_publisher):
+    def _initTimers(self):
         """
-        INTERNAL METHOD, publishes the state of the robot's joints into the ROS
-        framework, overloading @_broadcastJointState in RosWrapper
+        INTERNAL METHOD, overloading @_initTimers in RosWrapper. The laser
+        values are published as well
+        """
+        RosWrapper._initTimers(self)
 
-        Parameters:
-            joint_state_publisher - The ROS publisher for the JointState
-            message, describing the state of the robot's joints (for API
-            consistency)
+        self._addTimer(
+            RosWrapper.LASER_FREQUENCY,
+            self._broadcastLasers,
+            self.laser_pub)
+
+    def _initMessages(self):
+        """
+        INTERNAL METHOD, overloading @_initMessages in RosWrapper. The wheels
+        of Pepper are published as extra joints, and the invariant content of
+        the LaserScan message is computed
         """
-        RosWrapper._broadcastJointState(
+        RosWrapper._initMessages(
             self,
-            joint_state_publisher,
             extra_joints={"WheelFL": 0.0, "WheelFR": 0.0, "WheelB": 0.0})
 
+        self._scan_msg = LaserScan()
+        self._scan_msg.header.frame_id = "base_footprint"
+        # -120 degres, 120 degres
+        self._scan_msg.angle_min = -2.0944
+        self._scan_msg.angle_max = 2.0944
+
+        # 240 degres FoV, 61 points (blind zones inc)
+        self._scan_msg.angle_increment =\
+            (2 * 2.0944) / (15.0 + 15.0 + 15.0 + 8.0 + 8.0)
+
+        # Detection ranges for the lasers in meters, 0.1 to 3.0 meters
+        self._scan_msg.range_min = 0.1
+        self._scan_msg.range_max = 3.0
+
+        # The ranges of the 3 lasers, separated by 2 blind zones of 8 points
+        self._scan_ranges = np.full(3*NUM_RAY + 16, -1.0, dtype=np.float32)
+
     def _velocityCallback(self, msg):
         """
         INTERNAL METHOD, callback triggered when a message is received on the
@@ -765,7 +1192,7 @@ class PepperRosWrapper(RosWrapper):
         Parameters:
             msg - a ROS message containing a Twist command
         """
-        self.robot.move(msg.linear.x, msg.linear.y, msg.angular.z)
+        self._move(msg.linear.x, msg.linear.y, msg.angular.z)
 
     def _moveToCallback(self, msg):
         """
@@ -820,7 +1247,7 @@ class PepperRosWrapper(RosWrapper):
             pose.orientation.z,
             pose.orientation.w])[-1]
 
-        self.robot.moveTo(
+        self._move_to(
             x,
             y,
             theta,
@@ -837,21 +1264,4 @@ class PepperRosWrapper(RosWrapper):
         Parameters:
             msg - an empty ROS message, with the Empty type
         """
-        self.robot.moveTo(0, 0, 0, _async=True)
-
-    def _spin(self):
-        """
-        INTERNAL METHOD, designed to emulate a ROS spin method
-        """
-        rate = rospy.Rate(self.frequency)
-
-        try:
-            while not self._wrapper_termination:
-                rate.sleep()
-                self._broadcastJointState(self.joint_states_pub)
-                self._broadcastOdometry(self.odom_pub)
-                self._broadcastLasers(self.laser_pub)
-                self._broadcastCamera()
-
-        except Exception as e:
-            print("Stopping the ROS wrapper: " + str(e))
+        self._move_to(0, 0, 0, _async=True)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # coding: utf-8
 import sys
+import time
 import unittest
 import pybullet
 from qibullet import SimulationManager
@@ -171,6 +172,24 @@ class CameraTest(unittest.TestCase):
             # unsubscribed won't block the program
             camera_obj._waitForCorrectImageFormat()
 
+    def test_get_frame_counter(self):
+        """
+        Test the getFrameCounter method
+        """
+        for camera_id, camera_obj in CameraTest.robot.camera_dict.items():
+            handle = CameraTest.robot.subscribeCamera(camera_id)
+            frame_counter = camera_obj.getFrameCounter()
+
+            # The counter increases as new frames are rendered
+            deadline = time.time() + 5.0
+
+            while camera_obj.getFrameCounter() == frame_counter and\
+                    time.time() < deadline:
+                time.sleep(0.01)
+
+            self.assertGreater(camera_obj.getFrameCounter(), frame_counter)
+            self.assertTrue(CameraTest.robot.unsubscribeCamera(handle))
+
     def test_camera_channels(self):
         """
         Test the number of channels for each camera.
@@ -267,6 +286,9 @@ class PepperCameraTest(CameraTest):
     def test_get_camera_resolution(self):
         CameraTest.test_get_camera_resolution(self)
 
+    def test_get_frame_counter(self):
+        CameraTest.test_get_frame_counter(self)
+
     def test_camera_channels(self):
         CameraTest.test_camera_channels(self)
 
@@ -318,6 +340,9 @@ class NaoCameraTest(CameraTest):
     def test_get_camera_resolution(self):
         CameraTest.test_get_camera_resolution(self)
 
+    def test_get_frame_counter(self):
+        CameraTest.test_get_frame_counter(self)
+
     def test_camera_channels(self):
         CameraTest.test_camera_channels(self)
 
@@ -369,6 +394,9 @@ class RomeoCameraTest(CameraTest):
     def test_get_camera_resolution(self):
         CameraTest.test_get_camera_resolution(self)
 
+    def test_get_frame_counter(self):
+        CameraTest.test_get_frame_counter(self)
+
     def test_camera_channels(self):
         CameraTest.test_camera_channels(self)
 